@@ -0,0 +1,193 @@
+"""
+Throughput / worst-case benchmark and fuzz suite for the text-processing functions in translator.py.
+Run with `python bench_text_processing.py`, exits non-zero on a super-linear regression or lost characters.
+"""
+import io
+import random
+import re
+import sys
+import time
+import tracemalloc
+import typing
+
+from translator import (
+    extract_html_tags,
+    iter_html_and_plaintext_stream,
+    reassemble_text_with_translations,
+    reassemble_tokens_with_translations,
+    remove_plaintext_except_newlines,
+    split_html_and_plaintext,
+    tokenize_html_and_plaintext,
+)
+
+BENCH_BASE_SIZE = 1 << 16         # characters of the smaller corpus, the larger one is BENCH_GROWTH times bigger
+BENCH_GROWTH = 4
+BENCH_MAX_RATIO = 10.0            # time(large) / time(small) above this is reported as super-linear (linear = BENCH_GROWTH)
+BENCH_REPEAT = 3
+
+# The original tag definition, only safe on short inputs (quadratic on unclosed '<'), used as reference by the fuzzer
+REFERENCE_TAG_PATTERN = re.compile(r'<[^>]+>|\{[^}]+\}')
+NOT_MARKUP_PATTERN = re.compile(r'[^<>{}\n]+')
+
+def bench_corpora(size: int) -> typing.Dict[str, str]:
+    """Generated inputs of roughly `size` characters, typical documents plus the adversarial shapes."""
+    def fill(unit):
+        return (unit * (size // len(unit) + 1))[:size]
+    return {
+        "document": fill("<div class='c'><p>Hello <b>world</b> from {name}!</p>\n  <span>Please translate this.</span></div>\n"),
+        "no_tags": fill("Plain text without any markup at all. "),
+        "unclosed_lt": fill("<"),
+        "unclosed_lt_text": fill("a <b "),
+        "unclosed_brace": fill("{"),
+        "long_attribute": "<a href='" + "x" * size + "'>link</a>",
+        "unclosed_attribute": "<a href='" + "x" * size,
+        "lt_in_attribute": fill('<a title="x<y">t</a> '),
+        "deep_nesting": "<div>" * (size // 11) + "x" + "</div>" * (size // 11),
+        "stray_brackets": fill("a < b > c { d } "),
+    }
+
+def char_kinds(parts: typing.Iterable[typing.Tuple[str, str]]) -> str:
+    """One letter per character, 't' inside a tag and 'p' in plaintext, to compare tokenizations that cut runs differently."""
+    return "".join(('t' if kind == 'tag' else 'p') * len(content) for kind, content in parts)
+
+def check_lossless(name: str, text: str) -> typing.List[str]:
+    """Invariants every text-processing function must keep, returns a list of failure messages."""
+    failures = []
+    parts = split_html_and_plaintext(text)
+    if "".join(content for _, content in parts) != text:
+        failures.append(f"{name}: split_html_and_plaintext lost characters")
+    if list(tokenize_html_and_plaintext(text)) != parts:
+        failures.append(f"{name}: tokenize_html_and_plaintext differs from split_html_and_plaintext")
+    tags = [content for kind, content in parts if kind == 'tag']
+    if extract_html_tags(text) != tags:
+        failures.append(f"{name}: extract_html_tags differs from the tags of split_html_and_plaintext")
+    expected_removed = "".join(content if kind == 'tag' else NOT_MARKUP_PATTERN.sub('', content) for kind, content in parts)
+    if remove_plaintext_except_newlines(text) != expected_removed:
+        failures.append(f"{name}: remove_plaintext_except_newlines lost tags, newlines or stray brackets")
+    # Tiny chunks re-scan whatever is held back on every read, keep them to the short fuzz inputs
+    for chunk_size in ((1, 7, 4096) if len(text) <= 1024 else (4096,)):
+        streamed = list(iter_html_and_plaintext_stream(io.StringIO(text), chunk_size, max_token_size=len(text) + 1))
+        if streamed != parts:
+            failures.append(f"{name}: streaming tokenizer with chunk_size={chunk_size} differs")
+            break
+    # Small token limits exercise the oversized paths: plaintext is cut into pieces and long openers are spooled,
+    # but every character must come back, with the same tag / plaintext kind as split_html_and_plaintext gives it
+    if len(text) <= 1024:
+        for chunk_size, max_token_size in ((1, 4), (3, 8), (7, 16)):
+            streamed = list(iter_html_and_plaintext_stream(io.StringIO(text), chunk_size, max_token_size))
+            if "".join(content for _, content in streamed) != text:
+                failures.append(f"{name}: streaming tokenizer with max_token_size={max_token_size} lost characters")
+                break
+            if char_kinds(streamed) != char_kinds(parts):
+                failures.append(f"{name}: streaming tokenizer with max_token_size={max_token_size} disagrees on what is a tag")
+                break
+    return failures
+
+def check_stream_oversized() -> typing.List[str]:
+    """Openers held back longer than max_token_size: a stray '{' in prose must not turn the rest of the text into tags."""
+    cases = {
+        "stray brace in prose": "Use { to open a block. " + "Some prose here. " * 10000 + "<p>Final paragraph</p> more text",
+        "long attribute": "<a href='" + "x" * 100000 + "'>link</a> text",
+        "stray lt before placeholder": "a < b " * 20000 + "{name} end",
+    }
+    failures = []
+    for name, text in cases.items():
+        streamed = list(iter_html_and_plaintext_stream(io.StringIO(text), 4096, max_token_size=1024))
+        if "".join(content for _, content in streamed) != text:
+            failures.append(f"{name}: streaming tokenizer lost characters")
+        elif char_kinds(streamed) != char_kinds(split_html_and_plaintext(text)):
+            failures.append(f"{name}: streaming tokenizer disagrees with split_html_and_plaintext on what is a tag")
+    return failures
+
+def fuzz_text_processing(iterations: int = 2000, seed: int = 0) -> typing.List[str]:
+    """Runs check_lossless over random strings built from markup characters, returns failure messages."""
+    rng = random.Random(seed)
+    alphabet = "<>{}/=\"' \nab."
+    failures = []
+    for i in range(iterations):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 200)))
+        name = f"fuzz #{i} {text!r}"
+        failures.extend(check_lossless(name, text))
+        if extract_html_tags(text) != REFERENCE_TAG_PATTERN.findall(text):
+            failures.append(f"{name}: tags differ from the original <[^>]+> / {{[^}}]+}} definition")
+        if failures:
+            break
+    return failures
+
+def compare_token_representations(size: int) -> typing.List[str]:
+    """
+    Tokenize + reassemble round trip of the "document" corpus with the list of (type, content) tuples
+    (split_html_and_plaintext / reassemble_text_with_translations) and with TextTokens, prints time and
+    tracemalloc peak of each. Returns a failure if the round trips disagree.
+    """
+    text = bench_corpora(size)["document"]
+
+    def with_tuples():
+        parts = split_html_and_plaintext(text)
+        return reassemble_text_with_translations(parts, [content for kind, content in parts if kind == 'plaintext'])
+
+    def with_tokens():
+        tokens = tokenize_html_and_plaintext(text)
+        return reassemble_tokens_with_translations(tokens, tokens.plaintext_segments())
+
+    results = {}
+    print(f"{'round trip':34} {'chars':>10} {'best ms':>9} {'peak MB':>8}")
+    for name, function in (("list of tuples", with_tuples), ("TextTokens", with_tokens)):
+        # Timed without tracing (tracemalloc slows allocations down a lot), peak measured in a separate run
+        timings = []
+        for _ in range(BENCH_REPEAT):
+            start = time.perf_counter()
+            results[name] = function()
+            timings.append(time.perf_counter() - start)
+        tracemalloc.start()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:34} {len(text):10} {min(timings) * 1000:9.1f} {peak / 1024 / 1024:8.2f}")
+    print()
+    return [] if results["list of tuples"] == results["TextTokens"] == text else ["TextTokens and list of tuples round trips differ"]
+
+def run_text_benchmarks(base_size: int = BENCH_BASE_SIZE) -> int:
+    """
+    Times every text-processing function over the generated corpora at two sizes and prints throughput.
+    Fails (returns 1) if a function grows super-linearly or any invariant of check_lossless breaks.
+    """
+    functions = {
+        "split_html_and_plaintext": split_html_and_plaintext,
+        "tokenize_html_and_plaintext": tokenize_html_and_plaintext,
+        "remove_plaintext_except_newlines": remove_plaintext_except_newlines,
+        "extract_html_tags": extract_html_tags,
+        "iter_html_and_plaintext_stream": lambda text: list(iter_html_and_plaintext_stream(io.StringIO(text))),
+    }
+    small = bench_corpora(base_size)
+    large = bench_corpora(base_size * BENCH_GROWTH)
+
+    def best_time(function, text):
+        timings = []
+        for _ in range(BENCH_REPEAT):
+            start = time.perf_counter()
+            function(text)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    failures = fuzz_text_processing() + check_stream_oversized() + compare_token_representations(base_size * BENCH_GROWTH * 4)
+    print(f"{'function':34} {'corpus':20} {'MB/s':>8} {'worst ms':>9} {'ratio':>6}")
+    for corpus, text in large.items():
+        failures.extend(check_lossless(corpus, small[corpus]))
+        for name, function in functions.items():
+            small_time = best_time(function, small[corpus])
+            large_time = best_time(function, text)
+            ratio = large_time / max(small_time, 1e-6)
+            throughput = len(text) / max(large_time, 1e-9) / 1e6
+            print(f"{name:34} {corpus:20} {throughput:8.1f} {large_time * 1000:9.2f} {ratio:6.1f}")
+            # Timer noise dominates tiny timings, only judge growth once the large run is measurable
+            if large_time > 0.01 and ratio > BENCH_MAX_RATIO:
+                failures.append(f"{corpus}: {name} looks super-linear, x{BENCH_GROWTH} input took x{ratio:.1f} time")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("PASS" if not failures else f"FAIL: {len(failures)} problem(s)")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(run_text_benchmarks())
@@ -2,11 +2,67 @@ import tkinter as tk
 from tkinter import scrolledtext, ttk, messagebox # Import ttk for Combobox
 import typing
 import re
+import sys
+import time
 import deepl
 import csv
+import cProfile
+import pstats
+import tracemalloc
+import atexit
+import sqlite3
+import uuid
+import queue
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import io
+import os
+import tempfile
+import struct
+import zlib
+from collections import OrderedDict, deque
+from array import array
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
 
 DEEPL_PROHIBIT_TRANSLATION = False
 
+STREAM_CHUNK_SIZE = 1 << 20       # characters read from the source per chunk
+STREAM_MAX_TOKEN_SIZE = 1 << 16   # longest tag / plaintext run held back across chunk boundaries
+STREAM_BATCH_CHARS = 1 << 15      # plaintext characters sent to the translator per batch
+
+TRANSLATION_MEMORY_FILE = "translation_memory.tmx" # loaded into the segment cache on startup if present
+
+MULTI_TRANSLATE_WORKERS = 8       # languages translated concurrently by the multi-language action
+MULTI_TRANSLATE_POLL_MS = 100
+
+DEEPL_CLIENT_POOL_SIZE = 8        # deepl.Translator clients shared by concurrent requests
+
+SESSION_DIR = "session"           # undo history and pane contents, kept between runs
+SESSION_CACHE_STATES = 8          # decompressed history states kept in memory
+SESSION_MAX_STATES = 1000         # oldest quarter of the history is dropped when it grows past this
+SESSION_COMPACT_MIN_BYTES = 1 << 20 # panes.dat is rewritten once it is this big and mostly unreferenced data
+
+CSV_TRANSLATE_WORKERS = 8         # CSV rows translated in parallel
+ORDERED_WRITER_CAPACITY = 256     # finished rows that may wait for an earlier, slower row
+ORDERED_WRITER_FLUSH_CHARS = 1 << 20
+
+SHARED_CACHE_ENV = "TRANSLATION_CACHE_DB" # set to a SQLite path to share the segment cache between workers
+SHARED_CACHE_FILE = "translation_cache.sqlite3"
+SHARED_CACHE_WRITE_BATCH = 500    # cache entries written per transaction
+SHARED_CACHE_CLAIM_TIMEOUT = 120.0 # seconds other workers wait for a segment someone else is translating
+SHARED_CACHE_POLL_INTERVAL = 0.2
+
+LOOP_MONITOR_INTERVAL_MS = 50     # DEBUG_MODE heartbeat of the Tk event loop
+LOOP_MONITOR_STALL_MS = 100       # heartbeat delays above this are recorded as stalls
+PROFILE_TOP_FUNCTIONS = 25
+
 class RuvysTaggedTranslator:
     
     ColourScheme = {
@@ -40,7 +96,7 @@ class RuvysTaggedTranslator:
     RIGHT_HELPTEXT = "Here you can check if the <> tags in both texts match fully by pressing the 'Check Tags' button.\n\nYou will also see the translated text with original tags preserved.\n\nIf you want to see only the <> tags, use the 'Filter <> tags' button.\n\nTo see only the plaintext, use the 'Filter plaintext' button.\n<Example tag>"
 
     def __init__(self, master):
-        self.DEBUG_MODE = False
+        self.DEBUG_MODE = "--debug" in sys.argv
         
         # Initialize the translator. It will attempt to read the API key from 'api.key' file
         try:
@@ -51,7 +107,13 @@ class RuvysTaggedTranslator:
         self.master = master
         master.title("<> Tag Comparator & Translator")
 
-        self.history = []
+        # Undo history lives on disk so it survives restarts, falls back to memory if the session can't be opened
+        # (another instance holds it, or its files are unreadable)
+        try:
+            self.history = SessionStore(SESSION_DIR)
+        except (OSError, ValueError, zlib.error) as e:
+            print(f"Error opening session '{SESSION_DIR}': {e}")
+            self.history = []
         self.history_index = -1
 
         self.master.bind_all("<Control-z>", lambda event: self.text_undo())
@@ -95,7 +157,10 @@ class RuvysTaggedTranslator:
         self.text_box_bottom.grid(row=0, column=1, sticky="nsew", padx=5, pady=5)
         self.text_box_bottom.insert(tk.END, self.RIGHT_HELPTEXT)
 
-        self.history.append([self.LEFT_HELPTEXT, self.RIGHT_HELPTEXT]) # Add initial state to history
+        if len(self.history):
+            self.text_paste_from_history(len(self.history) - 1) # Reopened session, only the latest state is loaded
+        else:
+            self.history.append([self.LEFT_HELPTEXT, self.RIGHT_HELPTEXT]) # Add initial state to history
 
         # --- Footer Frame ---
         self.footer_frame = tk.Frame(master, bg=self.ColourScheme["footer_bg"], height=50)
@@ -281,6 +346,21 @@ class RuvysTaggedTranslator:
         self.button_csv.grid(row=0, column=9, padx=5, pady=5, sticky="ew")
         #tmp disable CSV button
         self.button_csv.config(state=tk.DISABLED)
+
+        self.button_multi = tk.Button(
+            self.footer_frame,
+            text="Multi",
+            command=self.show_multi_translate_popup,
+            bg=self.ColourScheme["action_blue"],
+            fg="white",
+            font=("Inter", 10, "bold"),
+            relief=tk.RAISED,
+            bd=2,
+            activebackground=self.ColourScheme["action_active_blue"],
+            padx=10, pady=5,
+            cursor="hand2"
+        )
+        self.button_multi.grid(row=0, column=10, padx=5, pady=5, sticky="ew")
         
         for i in range(6):
             self.footer_frame.grid_columnconfigure(i, weight=0)  # Fixed width buttons
@@ -288,6 +368,8 @@ class RuvysTaggedTranslator:
         self.footer_frame.grid_columnconfigure(7, weight=0)  # Undo button
         self.footer_frame.grid_columnconfigure(8, weight=0)  # Redo button
         self.footer_frame.grid_columnconfigure(9, weight=0)
+        self.footer_frame.grid_columnconfigure(10, weight=0)
+        self.footer_frame.grid_columnconfigure(11, weight=0)
 
         
 
@@ -298,6 +380,70 @@ class RuvysTaggedTranslator:
         # Initial update for the language status
         self.update_language_status()
 
+        if self.DEBUG_MODE:
+            self._setup_debug_tools()
+
+    def _setup_debug_tools(self):
+        """
+        DEBUG_MODE only: starts the event loop monitor and routes every footer button through
+        _run_debug_action, so an action can be profiled when 'Profile' is ticked.
+        """
+        self.loop_monitor = EventLoopMonitor(self.master)
+        self.loop_monitor.start()
+
+        self.profile_actions_var = tk.BooleanVar(self.master, value=False)
+        self.check_profile = tk.Checkbutton(
+            self.footer_frame,
+            text="Profile",
+            variable=self.profile_actions_var,
+            bg=self.ColourScheme["footer_bg"],
+            fg="white",
+            selectcolor=self.ColourScheme["footer_bg"],
+            activebackground=self.ColourScheme["footer_bg"],
+            font=("Inter", 10, "bold")
+        )
+        self.check_profile.grid(row=0, column=11, padx=5, pady=5, sticky="ew")
+
+        actions = { # button text -> (name, action)
+            "Check Tags": ("Check Tags", self.check_texts_equality),
+            "Filter <> tags": ("Filter <> tags", self.convert_texts_tags),
+            "Filter plaintext": ("Filter plaintext", self.convert_texts_plaintext),
+            "Translate": ("Translate", self.translate_content),
+            "Debug Tags": ("Debug Tags", self.debug_texts),
+            "CSV": ("CSV", self.show_csv_popup),
+            "Multi": ("Multi", self.show_multi_translate_popup),
+            "↶": ("Undo", self.text_undo),
+            "↷": ("Redo", self.text_redo),
+        }
+        # Some footer buttons share an attribute name, so find them through the frame
+        for widget in self.footer_frame.winfo_children():
+            if isinstance(widget, tk.Button) and widget.cget("text") in actions:
+                name, action = actions[widget.cget("text")]
+                widget.config(command=lambda name=name, action=action: self._run_debug_action(name, action))
+
+    def _run_debug_action(self, name: str, action: typing.Callable[[], typing.Any]):
+        # Actions run inside a Tk callback, so their wall time is exactly how long the main loop was blocked
+        if not self.profile_actions_var.get():
+            start = time.perf_counter()
+            action()
+            print(f"[debug] {name}: blocked the event loop for {(time.perf_counter() - start) * 1000:.1f} ms")
+            return
+        start = time.perf_counter()
+        _, report = profile_call(action)
+        blocked_ms = (time.perf_counter() - start) * 1000
+        # The heartbeat delayed by this action only fires once we return, open the popup after it
+        self.master.after(self.loop_monitor.interval_ms, lambda: self.show_profile_popup(name, report, blocked_ms))
+
+    def show_profile_popup(self, name: str, report: str, blocked_ms: float = 0.0):
+        popup = tk.Toplevel(self.master)
+        popup.title(f"Profile: {name}")
+        popup.geometry("900x500")
+
+        text_box = scrolledtext.ScrolledText(popup, wrap=tk.NONE, font=("Consolas", 10))
+        text_box.pack(fill="both", expand=True)
+        text_box.insert(tk.END, f"{report}\n\nEvent loop blocked by {name}: {blocked_ms:.0f} ms\n{self.loop_monitor.summary()}")
+        text_box.config(state=tk.DISABLED)
+
     def _on_window_resize(self, event):
         min_width = 800
         
@@ -345,10 +491,7 @@ class RuvysTaggedTranslator:
         text_top = self.text_box_top.get("1.0", tk.END)
         text_bottom = self.text_box_bottom.get("1.0", tk.END)
 
-        cleaned_top = remove_plaintext_except_newlines(text_top).replace('\n', '')
-        cleaned_bottom = remove_plaintext_except_newlines(text_bottom).replace('\n', '')
-
-        if cleaned_top == cleaned_bottom:
+        if tags_match(text_top, text_bottom):
             self.update_status("PASS: Tags match")
         else:
             self.update_status("FAIL: Tags do NOT match")
@@ -407,7 +550,7 @@ class RuvysTaggedTranslator:
         
         # delete all history after current index, counting up from 0
         if self.history_index != -1: 
-            self.history = self.history[:self.history_index + 1]
+            del self.history[self.history_index + 1:]
 
         #ignore type errors, caught by the exception above
         
@@ -438,11 +581,8 @@ class RuvysTaggedTranslator:
         text_top = self.text_box_top.get("1.0", tk.END)
         text_bottom = self.text_box_bottom.get("1.0", tk.END)
 
-        pattern = r'(?:<[^>]+>|\{[^}]+\})'
-
-
-        converted_top =     re.sub(pattern, '', text_top).strip()
-        converted_bottom =  re.sub(pattern, '', text_bottom).strip()
+        converted_top =     remove_tags(text_top).strip()
+        converted_bottom =  remove_tags(text_bottom).strip()
 
         self.text_update("both", [converted_top, converted_bottom])
 
@@ -471,8 +611,8 @@ class RuvysTaggedTranslator:
         if not self.translator:
             return ""
         
-        text_parts = split_html_and_plaintext(source_text)
-        plaintext_segments = [content for part_type, content in text_parts if part_type == 'plaintext']
+        tokens = tokenize_html_and_plaintext(source_text)
+        plaintext_segments = list(tokens.plaintext_segments())
 
         try:
             translated_plaintexts = []
@@ -481,13 +621,23 @@ class RuvysTaggedTranslator:
             else:
                 translated_plaintexts = plaintext_segments
             
-            final_translated_text = reassemble_text_with_translations(text_parts, translated_plaintexts)
+            final_translated_text = reassemble_tokens_with_translations(tokens, translated_plaintexts)
 
         except Exception as e:
             print(f"Translation error: {e}")
 
         return final_translated_text
 
+    def translate_file_headless(self, input_file: str, output_file: str, target_lang: str, chunk_size: int = STREAM_CHUNK_SIZE) -> bool:
+        """
+        Translates a (possibly huge) HTML file without loading it into memory.
+        The source is read in chunks and the output written as each batch of segments is translated.
+        """
+        if not self.translator:
+            return False
+
+        return translate_file(self.translator, input_file, output_file, target_lang, chunk_size)
+
     def translate_content(self):
         if not self.translator:
             self.show_api_key_prompt()
@@ -502,8 +652,8 @@ class RuvysTaggedTranslator:
         self.lang_selector.config(state=tk.DISABLED)
         self.update_status("Processing text for translation...")
 
-        text_parts = split_html_and_plaintext(source_text)
-        plaintext_segments = [content for part_type, content in text_parts if part_type == 'plaintext']
+        tokens = tokenize_html_and_plaintext(source_text)
+        plaintext_segments = list(tokens.plaintext_segments())
 
         if not plaintext_segments:
             self.update_status("No plaintext found to translate.")
@@ -522,7 +672,7 @@ class RuvysTaggedTranslator:
             else:
                 translated_plaintexts = plaintext_segments
             
-            final_translated_text = reassemble_text_with_translations(text_parts, translated_plaintexts)
+            final_translated_text = reassemble_tokens_with_translations(tokens, translated_plaintexts)
 
             self.text_update("bottom", final_translated_text)
             self.update_status("PASS: Translation complete")
@@ -533,6 +683,153 @@ class RuvysTaggedTranslator:
             self.lang_selector.config(state="readonly")
 
 
+    def show_multi_translate_popup(self):
+        """Lets the user pick several target languages and translates the left text into all of them."""
+        if not self.translator:
+            self.show_api_key_prompt()
+            return
+
+        popup = tk.Toplevel(self.master)
+        popup.title("Translate to multiple languages")
+        popup.geometry("420x460")
+
+        tk.Label(popup, text="Target languages (click to select several):").pack(anchor="w", padx=10, pady=(10, 0))
+        list_frame = tk.Frame(popup)
+        list_frame.pack(fill="both", expand=True, padx=10, pady=5)
+        scrollbar = tk.Scrollbar(list_frame)
+        scrollbar.pack(side="right", fill="y")
+        lang_listbox = tk.Listbox(list_frame, selectmode=tk.MULTIPLE, exportselection=False, yscrollcommand=scrollbar.set)
+        lang_listbox.pack(side="left", fill="both", expand=True)
+        scrollbar.config(command=lang_listbox.yview)
+
+        codes = self.translator.available_languages()
+        for index, desc in enumerate(self.translator.available_languages_desc()):
+            lang_listbox.insert(tk.END, desc)
+            if codes[index] == self.translator.current_language():
+                lang_listbox.selection_set(index)
+
+        def submit():
+            selected = [codes[i] for i in lang_listbox.curselection()]
+            if not selected:
+                messagebox.showerror("Multi Translate", "Select at least one target language.")
+                return
+            popup.destroy()
+            self.translate_content_multi(selected)
+
+        tk.Button(popup, text="Translate", command=submit).pack(pady=10)
+
+    def translate_content_multi(self, target_langs: typing.List[str]):
+        """
+        Tokenizes the left text once and translates it into all target_langs concurrently.
+        Each language gets its own tab in a result window, checked against the source tags as it arrives.
+        """
+        if not self.translator:
+            self.show_api_key_prompt()
+            return
+
+        source_text = self.text_box_top.get("1.0", tk.END).strip()
+        if not source_text:
+            self.update_status("FAIL: Nothing to translate")
+            return
+
+        tokens = tokenize_html_and_plaintext(source_text)
+        plaintext_segments = list(tokens.plaintext_segments())
+
+        # --- Result window, one tab per language ---
+        window = tk.Toplevel(self.master)
+        window.title(f"Translations ({len(target_langs)} languages)")
+        window.geometry("800x500")
+        notebook = ttk.Notebook(window)
+        notebook.pack(fill="both", expand=True)
+
+        tabs = {}
+        for lang in target_langs:
+            frame = tk.Frame(notebook, bg=self.ColourScheme["footer_bg"])
+            status = tk.Label(frame, text="Translating...", bg=self.ColourScheme["footer_bg"], fg=self.ColourScheme["msg_working"],
+                              font=self.ColourScheme["font"], anchor="w")
+            status.pack(fill="x", padx=10, pady=5)
+            text_box = scrolledtext.ScrolledText(
+                frame,
+                wrap=tk.WORD,
+                bg=self.ColourScheme["background"],
+                fg=self.ColourScheme["foreground"],
+                font=self.ColourScheme["font"],
+                relief=tk.FLAT,
+                padx=10,
+                pady=10
+            )
+            text_box.pack(fill="both", expand=True)
+            tk.Button(frame, text="Use as result", command=lambda box=text_box: self.text_update("bottom", box.get("1.0", "end-1c"))
+                      ).pack(anchor="e", padx=10, pady=5)
+            notebook.add(frame, text=lang)
+            tabs[lang] = (status, text_box)
+
+        self.button_translate.config(state=tk.DISABLED)
+        self.button_multi.config(state=tk.DISABLED)
+        self.update_status(f"Translating {len(plaintext_segments)} segments to {len(target_langs)} languages...")
+
+        translator = self.translator
+
+        def translate_one(lang):
+            if DEEPL_PROHIBIT_TRANSLATION or not plaintext_segments:
+                return plaintext_segments
+            return translator.translate_batch(plaintext_segments, lang)
+
+        # Resolved up front, each worker passes its own language and never touches the shared target language
+        langs = {lang: translator.resolve_language(lang) for lang in target_langs}
+        executor = ThreadPoolExecutor(max_workers=min(len(target_langs), MULTI_TRANSLATE_WORKERS))
+        futures = {lang: executor.submit(translate_one, code) for lang, code in langs.items()}
+        failed = []
+        closed = [] # non-empty once the result window is gone, late results are dropped
+
+        def on_window_destroy(event):
+            if event.widget is window:
+                closed.append(True)
+        window.bind("<Destroy>", on_window_destroy)
+
+        # Tk is not thread safe, results are picked up from the main loop
+        def poll():
+            try:
+                for lang, future in list(futures.items()):
+                    if closed:
+                        break
+                    if not future.done():
+                        continue
+                    del futures[lang]
+                    status, text_box = tabs[lang]
+                    try:
+                        translated_text = reassemble_tokens_with_translations(tokens, future.result())
+                    except Exception as e:
+                        failed.append(lang)
+                        status.config(text=f"FAIL: Translation error - {e}", fg=self.ColourScheme["msg_fail"])
+                        continue
+                    text_box.insert(tk.END, translated_text)
+                    if tags_match(source_text, translated_text):
+                        status.config(text="PASS: Tags match", fg=self.ColourScheme["msg_pass"])
+                    else:
+                        failed.append(lang)
+                        status.config(text="FAIL: Tags do NOT match", fg=self.ColourScheme["msg_fail"])
+            except tk.TclError:
+                closed.append(True) # window closed while updating a tab
+            finally:
+                if futures and not closed:
+                    self.master.after(MULTI_TRANSLATE_POLL_MS, poll)
+                else:
+                    # Done or abandoned, either way the buttons must come back
+                    for future in futures.values():
+                        future.cancel()
+                    executor.shutdown(wait=False)
+                    self.button_translate.config(state=tk.NORMAL)
+                    self.button_multi.config(state=tk.NORMAL)
+                    if closed and futures:
+                        self.update_status(f"Translations window closed, dropped {', '.join(futures)}")
+                    elif failed:
+                        self.update_status(f"FAIL: {', '.join(failed)}")
+                    else:
+                        self.update_status(f"PASS: Translated to {len(target_langs)} languages")
+
+        self.master.after(MULTI_TRANSLATE_POLL_MS, poll)
+
     def on_language_selected(self, event):
         """
         Callback for when a language is selected from the Combobox.
@@ -655,29 +952,19 @@ class RuvysTaggedTranslator:
             print(f"Error reading CSV file: {e}")
             return False
 
-        source_texts = []
-        for i, row in enumerate(rows):
-            if i == target_lang_row:
-                continue
-            if len(row) > source_column:
-                source_texts.append(row[source_column])
-            else:
-                print(f"Row {rows.index(row)} does not have enough columns. Skipping.")
+        source_texts, target_langs, header = csv_job_layout(rows, target_lang_row, source_column, ignored_columns)
 
-        target_langs = []
-        for index, lang in enumerate(rows[target_lang_row]):
-            if index not in ignored_columns:
-                target_langs.append(lang.strip())
+        # Refuse up front instead of running out of quota halfway through the file
+        if self.translator and not DEEPL_PROHIBIT_TRANSLATION:
+            scheduler = QuotaScheduler(self.translator)
+            scheduler.add_job(TranslationJob(input_file, source_texts, target_langs))
+            warning = scheduler.preflight()
+            if warning is not None:
+                raise Exception(f"CSV translation not started. {warning}")
             
-        with open(output_file, 'w', encoding='utf-8', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            # Write header
-            header = [rows[target_lang_row][source_column]] + [rows[target_lang_row][i] for i in ignored_columns]
-            writer.writerow(header)
-
-            # Translate each source text and write to the corresponding target columns
-            for source_text in source_texts:
-                translated_texts = []
+        def translate_row(index, source_text):
+            translated_texts = []
+            try:
                 for target_lang in target_langs:
                     try:
                         translated_text = self.translate_texts_headless(source_text, target_lang)
@@ -685,11 +972,34 @@ class RuvysTaggedTranslator:
                     except Exception as e:
                         print(f"Error translating text '{source_text}' to {target_lang}: {e}")
                         translated_texts.append(e)
-            
-                # Write the source text and its translations to the CSV
-                row_to_write = [source_text] + translated_texts
-                writer.writerow(row_to_write)
+            finally:
+                # Write the source text and its translations to the CSV, in input order.
+                # Always submitted, a missing row would stall every row after it.
+                row_writer.submit(index, [source_text] + translated_texts)
 
+        with open(output_file, 'w', encoding='utf-8', newline='', buffering=ORDERED_WRITER_FLUSH_CHARS) as csvfile:
+            writer = csv.writer(csvfile)
+            # Write header
+            writer.writerow(header)
+
+            # Translate rows in parallel, each worker handles all target columns of its row
+            row_writer = OrderedRowWriter(csvfile)
+            try:
+                with ThreadPoolExecutor(max_workers=CSV_TRANSLATE_WORKERS) as executor:
+                    futures = [executor.submit(translate_row, index, source_text) for index, source_text in enumerate(source_texts)]
+                    for future in futures:
+                        future.result()
+            finally:
+                row_writer.close() # writes whatever rows are complete even if a worker failed
+
+
+# Tags are <...> and {...} up to the first closing bracket, like the original '<[^>]+>|\{[^}]+\}' pattern.
+# Matching that regex at every unclosed '<' scans to the end of the text ('<<<<...' was quadratic),
+# so the spans are found by hand instead, remembering where the next closing bracket is.
+_OPENER_PATTERN = re.compile(r'[<{]')
+_CLOSERS = {'<': '>', '{': '}'}
+# What remove_plaintext_except_newlines keeps of plaintext: newlines and stray brackets, same as the original pattern
+_NOT_MARKUP_PATTERN = re.compile(r'[^<>{}\n]+')
 
 def extract_html_tags(html_snippet: str) -> list[str]:
     """
@@ -697,31 +1007,33 @@ def extract_html_tags(html_snippet: str) -> list[str]:
     from a given HTML snippet, including any attributes.
     """
     # pattern = r'<[^>]+>'
-    pattern = r'(?:<[^>]+>|\{[^}]+\})'
-    
-    tags = re.findall(pattern, html_snippet)
+    tags = [html_snippet[start:end] for kind, start, end in _iter_split_spans(html_snippet) if kind == TOKEN_TAG]
     return tags
 
 def remove_plaintext_except_newlines(html_snippet: str) -> str:
     """
     Removes all plaintext content from an HTML snippet, preserving only
     HTML tags (including attributes) and newline characters.
+    Stray '<', '>', '{' and '}' are kept too, so tags_match still notices them.
     """
     # pattern = r'(<[^>]+>)|(\n)|([^<>\n]+)'
-    pattern = r'(<[^>]+>|\{[^}]+\})|(\n)|([^<>{}\n]+)'
-    
-
+    kept = io.StringIO()
+    for kind, start, end in _iter_split_spans(html_snippet):
+        if kind == TOKEN_TAG:
+            kept.write(html_snippet[start:end])
+        else:
+            kept.write(_NOT_MARKUP_PATTERN.sub('', html_snippet[start:end]))
+    return kept.getvalue()
 
-    def replacer(match):
-        if match.group(1):
-            return match.group(1)
-        elif match.group(2):
-            return match.group(2)
-        elif match.group(3):
-            return ''
-        return ''
+def remove_tags(html_snippet: str) -> str:
+    """Removes all HTML tags and {} placeholders, keeping everything else."""
+    return "".join(html_snippet[start:end] for kind, start, end in _iter_split_spans(html_snippet) if kind == TOKEN_PLAINTEXT)
 
-    return re.sub(pattern, replacer, html_snippet)
+def tags_match(text_a: str, text_b: str) -> bool:
+    """Checks that both texts contain the same <> tags and {} placeholders in the same order, ignoring newlines."""
+    cleaned_a = remove_plaintext_except_newlines(text_a).replace('\n', '')
+    cleaned_b = remove_plaintext_except_newlines(text_b).replace('\n', '')
+    return cleaned_a == cleaned_b
 
 def split_html_and_plaintext(text: str) -> typing.List[typing.Tuple[str, str]]:
     """
@@ -729,18 +1041,118 @@ def split_html_and_plaintext(text: str) -> typing.List[typing.Tuple[str, str]]:
     Each tuple is (type, content), where type is 'tag' or 'plaintext'.
     """
     parts = []
-    # Regex to capture either an HTML tag or any text that is not part of a tag
-    # re.DOTALL ensures that '.' matches newlines as well, allowing plaintext to span lines.
-    # pattern = re.compile(r'(<[^>]+>)|([^<]+)', re.DOTALL)
-    pattern = re.compile(r'(<[^>]+>|\{[^}]+\})|([^<>{}]+)', re.DOTALL)
+    # Shared with tokenize_html_and_plaintext, see _iter_split_spans below
+    for kind, start, end in _iter_split_spans(text):
+        parts.append((TOKEN_KIND_NAMES[kind], text[start:end]))
+    return parts
 
+def _iter_split_spans(text: str) -> typing.Iterator[typing.Tuple[int, int, int]]:
+    """
+    Yields (kind, start, end) for every tag and plaintext run. A '<' or '{' with no closing bracket
+    after it is not a tag and stays part of the plaintext around it, so no character is ever dropped.
+    Linear: the position of the next closing bracket is looked up once and reused for every opener before it.
+    """
+    length = len(text)
+    next_closer = {'<': -1, '{': -1} # position of the next closing bracket, length if there is none
+    plain_start = 0
+    pos = 0
+    while True:
+        match = _OPENER_PATTERN.search(text, pos)
+        if match is None:
+            break
+        opener_pos = match.start()
+        opener = text[opener_pos]
+        closer_pos = next_closer[opener]
+        if closer_pos <= opener_pos:
+            closer_pos = text.find(_CLOSERS[opener], opener_pos + 1)
+            if closer_pos == -1:
+                closer_pos = length
+            next_closer[opener] = closer_pos
+        if closer_pos == length or closer_pos == opener_pos + 1:
+            pos = opener_pos + 1 # stray opener, e.g. "a < b" or "<>"
+            continue
+        if plain_start < opener_pos:
+            yield TOKEN_PLAINTEXT, plain_start, opener_pos
+        yield TOKEN_TAG, opener_pos, closer_pos + 1
+        pos = plain_start = closer_pos + 1
+    if plain_start < length:
+        yield TOKEN_PLAINTEXT, plain_start, length
+
+TOKEN_TAG = 0
+TOKEN_PLAINTEXT = 1
+TOKEN_KIND_NAMES = ('tag', 'plaintext')
+
+class TextTokens:
+    """
+    Compact token store for split_html_and_plaintext results.
+    Keeps a reference to the original string plus parallel arrays of kind/start/end,
+    fragments are only sliced out of the source when asked for.
+    """
+    __slots__ = ('text', 'kinds', 'starts', 'ends')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.kinds = array('B')
+        self.starts = array('Q')
+        self.ends = array('Q')
+
+    def append(self, kind: int, start: int, end: int):
+        self.kinds.append(kind)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __iter__(self) -> typing.Iterator[typing.Tuple[str, str]]:
+        """Yields (type, content) tuples, same shape as split_html_and_plaintext."""
+        text = self.text
+        for kind, start, end in zip(self.kinds, self.starts, self.ends):
+            yield TOKEN_KIND_NAMES[kind], text[start:end]
+
+    def plaintext_segments(self) -> typing.Iterator[str]:
+        """Lazily yields plaintext fragments in document order."""
+        text = self.text
+        for kind, start, end in zip(self.kinds, self.starts, self.ends):
+            if kind == TOKEN_PLAINTEXT:
+                yield text[start:end]
+
+def tokenize_html_and_plaintext(text: str) -> TextTokens:
+    """
+    Offset based variant of split_html_and_plaintext, meant for very large inputs.
+    Same tokenization rules, but no fragment is copied until it is needed.
+    """
+    tokens = TextTokens(text)
+    for kind, start, end in _iter_split_spans(text):
+        tokens.append(kind, start, end)
+    return tokens
+
+def write_tokens_with_translations(
+    tokens: TextTokens, translated_plaintexts: typing.Iterable[str], out: typing.TextIO
+) -> None:
+    """
+    Streams the reassembled text into `out` (any object with .write), without building
+    an intermediate list. Translations are consumed in order of the plaintext tokens.
+    """
+    text = tokens.text
+    translations = iter(translated_plaintexts)
+    for kind, start, end in zip(tokens.kinds, tokens.starts, tokens.ends):
+        if kind == TOKEN_TAG:
+            out.write(text[start:end])
+            continue
+        translated = next(translations, None)
+        if translated is None:
+            # Fallback: if somehow translation is missing, use original plaintext
+            print(f"Warning: Missing translation for plaintext segment: '{text[start:end]}'. Using original.")
+            out.write(text[start:end])
+        else:
+            out.write(translated)
 
-    for match in pattern.finditer(text):
-        if match.group(1):  # It's an HTML tag
-            parts.append(('tag', match.group(1)))
-        elif match.group(2): # It's plaintext
-            parts.append(('plaintext', match.group(2)))
-    return parts
+def reassemble_tokens_with_translations(tokens: TextTokens, translated_plaintexts: typing.Iterable[str]) -> str:
+    """Compact counterpart of reassemble_text_with_translations, writes into a single buffer."""
+    buffer = io.StringIO()
+    write_tokens_with_translations(tokens, translated_plaintexts, buffer)
+    return buffer.getvalue()
 
 def reassemble_text_with_translations(
     original_parts: typing.List[typing.Tuple[str, str]], translated_plaintexts: typing.List[str]
@@ -765,6 +1177,1021 @@ def reassemble_text_with_translations(
     return "".join(reassembled_text)
 
 
+def _split_oversized_plaintext(fragment: str) -> int:
+    """Returns a cut position for a plaintext run that is too long to hold, preferring line/word ends."""
+    for separator in ('\n', '. ', ' '):
+        cut = fragment.rfind(separator)
+        if cut > 0:
+            return cut + len(separator)
+    return len(fragment)
+
+def iter_html_and_plaintext_stream(
+    reader: typing.TextIO, chunk_size: int = STREAM_CHUNK_SIZE, max_token_size: int = STREAM_MAX_TOKEN_SIZE
+) -> typing.Iterator[typing.Tuple[str, str]]:
+    """
+    Streaming variant of split_html_and_plaintext, reads `reader` in chunks and yields
+    (type, content) tuples as soon as they can no longer change.
+    Tags, {placeholders} and plaintext runs that straddle a chunk boundary are held back
+    until the next chunk arrives. A plaintext run held back longer than max_token_size is
+    split at the last newline/sentence/word end. An unclosed '<' or '{' held back longer than that
+    is moved to a temporary file until its closing bracket turns up (a long tag, yielded as 'tag' pieces)
+    or the input ends (a stray bracket, it and the text after it are plaintext as in split_html_and_plaintext).
+    Memory stays bounded for any input.
+    """
+    yield from _iter_stream_spans(reader, chunk_size, max_token_size, "")
+
+def _iter_stream_spans(reader: typing.TextIO, chunk_size: int, max_token_size: int, stray: str) -> typing.Iterator[typing.Tuple[str, str]]:
+    """iter_html_and_plaintext_stream for input where the openers in `stray` are known to have no closing bracket left."""
+    buffer = ""
+    eof = False
+    refill = True
+    while True:
+        if refill:
+            chunk = reader.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+
+        hold = len(buffer)  # everything before hold is final
+        # A stray opener can never become a tag, as if its closing bracket was beyond the end of the buffer
+        last_closers = (len(buffer) if '<' in stray else buffer.rfind('>'), len(buffer) if '{' in stray else buffer.rfind('}'))
+        held_end = len(buffer)
+        ready = []
+        for kind, start, end in _iter_split_spans(buffer):
+            # Tags are final once matched. Plaintext is not if it runs to the end of the buffer,
+            # or holds a '<' / '{' with no closing bracket after it yet, more data could turn that into a tag.
+            if not eof and kind == TOKEN_PLAINTEXT and (end == len(buffer) or _has_unclosed_opener(buffer, start, end, last_closers)):
+                hold, held_end = start, end
+                break
+            ready.append((TOKEN_KIND_NAMES[kind], buffer[start:end]))
+
+        yield from ready
+
+        refill = True
+        if not eof and len(buffer) - hold > max_token_size:
+            refill = False  # drain the oversized tail before reading more
+            opener_pos = _first_unclosed_opener(buffer, hold, held_end, last_closers)
+            plain_end = held_end if opener_pos == -1 else opener_pos
+            while len(buffer) - hold > max_token_size and hold < plain_end:
+                fragment = buffer[hold:min(plain_end, hold + max_token_size)]
+                cut = _split_oversized_plaintext(fragment) if len(fragment) == max_token_size else len(fragment)
+                yield ('plaintext', fragment[:cut])
+                hold += cut
+            if hold == opener_pos and len(buffer) - hold > max_token_size:
+                # Too long to hold in memory, whether it is a tag is only known once its closing bracket (or EOF) is read
+                opener = buffer[hold]
+                with tempfile.TemporaryFile('w+', encoding='utf-8', newline='') as spool:
+                    spool.write(buffer[hold:])
+                    rest = _spool_until_closer(reader, spool, _CLOSERS[opener], chunk_size)
+                    spool.seek(0)
+                    if rest is None:
+                        # Never closed: a stray bracket, tokenize what followed it again knowing that
+                        yield ('plaintext', spool.read(1))
+                        yield from _iter_stream_spans(spool, chunk_size, max_token_size, stray + opener)
+                        return
+                    for piece in iter(lambda: spool.read(max_token_size), ""):
+                        yield ('tag', piece)
+                buffer = rest
+                continue
+        buffer = buffer[hold:]
+        if eof:
+            break
+
+def _spool_until_closer(reader: typing.TextIO, spool: typing.TextIO, closer: str, chunk_size: int) -> typing.Optional[str]:
+    """Copies reader to spool up to and including the first `closer`, returns the rest of that chunk or None at EOF."""
+    while True:
+        chunk = reader.read(chunk_size)
+        if not chunk:
+            return None
+        closer_pos = chunk.find(closer)
+        if closer_pos != -1:
+            spool.write(chunk[:closer_pos + 1])
+            return chunk[closer_pos + 1:]
+        spool.write(chunk)
+
+def _has_unclosed_opener(buffer: str, start: int, end: int, last_closers: typing.Tuple[int, int]) -> bool:
+    """True if buffer[start:end] contains a '<' or '{' after the last '>' / '}' of the buffer."""
+    last_gt, last_brace = last_closers
+    return buffer.rfind('<', start, end) > last_gt or buffer.rfind('{', start, end) > last_brace
+
+def _first_unclosed_opener(buffer: str, start: int, end: int, last_closers: typing.Tuple[int, int]) -> int:
+    """Position of the first '<' / '{' in buffer[start:end] after the last '>' / '}' of the buffer, -1 if none."""
+    last_gt, last_brace = last_closers
+    positions = [pos for pos in (buffer.find('<', max(start, last_gt + 1), end), buffer.find('{', max(start, last_brace + 1), end)) if pos != -1]
+    return min(positions) if positions else -1
+
+def translate_stream(
+    reader: typing.TextIO,
+    writer: typing.TextIO,
+    translate_batch: typing.Callable[[typing.List[str]], typing.List[str]],
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    batch_chars: int = STREAM_BATCH_CHARS,
+) -> int:
+    """
+    Tokenizes `reader` incrementally, sends plaintext segments to `translate_batch` in batches
+    of roughly batch_chars characters and writes the reassembled output to `writer` as each batch returns.
+    Returns the number of plaintext segments translated.
+    """
+    pending = []       # (type, content) tokens waiting for the current batch
+    batch = []         # plaintext segments of the current batch
+    batch_size = 0
+    translated_count = 0
+
+    def flush():
+        translations = iter(translate_batch(batch) if batch else [])
+        for kind, content in pending:
+            if kind == 'tag':
+                writer.write(content)
+            else:
+                translated = next(translations, None)
+                if translated is None:
+                    print(f"Warning: Missing translation for plaintext segment: '{content}'. Using original.")
+                    translated = content
+                writer.write(translated)
+        pending.clear()
+        batch.clear()
+
+    for kind, content in iter_html_and_plaintext_stream(reader, chunk_size):
+        pending.append((kind, content))
+        if kind == 'plaintext':
+            batch.append(content)
+            batch_size += len(content)
+            translated_count += 1
+            if batch_size >= batch_chars:
+                flush()
+                batch_size = 0
+    flush()
+    return translated_count
+
+
+
+def translate_file(translator: "DeepLTranslator", input_file: str, output_file: str, target_lang: str, chunk_size: int = STREAM_CHUNK_SIZE) -> bool:
+    """Streams input_file through translate_stream into output_file, memory use does not depend on the file size."""
+    def translate_batch(segments):
+        if DEEPL_PROHIBIT_TRANSLATION:
+            return segments
+        return translator.translate_batch(segments, target_lang)
+
+    try:
+        with open(input_file, 'r', encoding='utf-8') as reader, open(output_file, 'w', encoding='utf-8', newline='') as writer:
+            translate_stream(reader, writer, translate_batch, chunk_size)
+    except Exception as e:
+        print(f"Error translating file '{input_file}': {e}")
+        return False
+    return True
+
+def normalize_segment(text: str) -> str:
+    """Cache key form of a segment, collapses all whitespace runs and strips the ends."""
+    return " ".join(text.split())
+
+def normalize_language(lang: str) -> str:
+    """
+    Maps a language tag from a TMX/CSV file (e.g. "de-DE", "en_us") onto the DeepL code used as cache key.
+    Falls back to the primary subtag when the full tag is not a DeepL target language.
+    """
+    code = lang.strip().replace("_", "-").upper()
+    if code in DeepLTranslator.available_langs:
+        return code
+    return code.split("-")[0]
+
+class TranslationCache:
+    """
+    In-memory segment cache used by DeepLTranslator.translate_batch.
+    Entries are indexed per target language and keyed by normalize_segment(source),
+    the original leading/trailing whitespace of a segment is put back on lookup.
+    Can be pre-warmed from TMX/CSV translation memories and exported back to TMX.
+    """
+
+    def __init__(self):
+        self.entries: typing.Dict[str, typing.Dict[str, str]] = {} # lang -> {normalised source: translation}
+        self._lock = threading.Lock() # shared by all threads using the same DeepLTranslator
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(lang_entries) for lang_entries in self.entries.values())
+
+    def get(self, text: str, lang: str) -> typing.Optional[str]:
+        translation = self._lookup(normalize_segment(text), lang.upper())
+        if translation is None:
+            return None
+        stripped = text.strip()
+        if not stripped:
+            return text
+        start = text.find(stripped)
+        return text[:start] + translation + text[start + len(stripped):]
+
+    def put(self, text: str, lang: str, translation: str):
+        key = normalize_segment(text)
+        if key:
+            self._store(key, lang.upper(), translation.strip())
+
+    def _lookup(self, key: str, lang: str) -> typing.Optional[str]:
+        with self._lock:
+            return self.entries.get(lang, {}).get(key)
+
+    def _store(self, key: str, lang: str, translation: str):
+        with self._lock:
+            self.entries.setdefault(lang, {})[key] = translation
+
+    def _iter_entries(self) -> typing.Iterator[typing.Tuple[str, str, str]]:
+        """Yields (lang, normalised source, translation) for every entry."""
+        with self._lock:
+            snapshot = [(lang, key, translation) for lang, lang_entries in self.entries.items() for key, translation in lang_entries.items()]
+        yield from snapshot
+
+    # Hooks for caches shared between processes, see SqliteTranslationCache. A private cache owns everything.
+
+    def claim(self, texts: typing.List[str], lang: str) -> typing.Set[int]:
+        """Returns the indices of texts this caller should translate itself, others are being translated elsewhere."""
+        return set(range(len(texts)))
+
+    def wait(self, texts: typing.List[str], lang: str) -> typing.List[typing.Optional[str]]:
+        """Waits for texts claimed by someone else, None for those that never arrived."""
+        return [self.get(text, lang) for text in texts]
+
+    def release(self, texts: typing.List[str], lang: str):
+        pass
+
+    def flush(self):
+        pass
+
+    def import_tmx(self, file_path: str, source_lang: str = "") -> int:
+        """
+        Loads translation units from a TMX file, returns the number of entries added.
+        The source language is taken from the header srclang unless given explicitly.
+        Parsed incrementally, so large memories do not need to fit in memory as a tree.
+        """
+        xml_lang = "{http://www.w3.org/XML/1998/namespace}lang"
+        source = normalize_language(source_lang) if source_lang else ""
+        imported = 0
+        open_elements = [] # path from the root to the current element, finished units are detached from their parent
+        for event, element in ElementTree.iterparse(file_path, events=("start", "end")):
+            if event == "start":
+                open_elements.append(element)
+                if element.tag == "header" and not source:
+                    srclang = element.get("srclang", "")
+                    if srclang and srclang != "*all*":
+                        source = normalize_language(srclang)
+                continue
+            open_elements.pop()
+            if element.tag != "tu":
+                continue
+            if not source:
+                raise ValueError(f"TMX file '{file_path}' does not declare a source language, pass source_lang explicitly.")
+
+            variants = {}
+            for tuv in element.iter("tuv"):
+                lang = tuv.get(xml_lang) or tuv.get("lang", "")
+                seg = tuv.find("seg")
+                if lang and seg is not None:
+                    variants[normalize_language(lang)] = "".join(seg.itertext())
+            source_text = variants.pop(source, None)
+            if source_text:
+                for lang, translation in variants.items():
+                    self.put(source_text, lang, translation)
+                    imported += 1
+            # Clearing alone would leave an empty <tu> per unit attached to <body>
+            element.clear()
+            if open_elements:
+                open_elements[-1].remove(element)
+        return imported
+
+    def import_csv(self, file_path: str, header_row: int = 0, source_column: int = 0) -> int:
+        """
+        Loads a CSV translation memory laid out like the csv_translate output:
+        the header row holds language codes, the source column holds the source texts.
+        Columns whose header is not a DeepL language are skipped. Returns the number of entries added.
+        """
+        imported = 0
+        with open(file_path, 'r', encoding='utf-8', newline='') as csvfile:
+            reader = csv.reader(csvfile)
+            languages = {}
+            for i, row in enumerate(reader):
+                if i < header_row:
+                    continue
+                if i == header_row:
+                    for column, header in enumerate(row):
+                        lang = normalize_language(header) if header.strip() else ""
+                        if column != source_column and lang in DeepLTranslator.available_langs:
+                            languages[column] = lang
+                    continue
+                if len(row) <= source_column or not row[source_column].strip():
+                    continue
+                for column, lang in languages.items():
+                    if column < len(row) and row[column].strip():
+                        self.put(row[source_column], lang, row[column])
+                        imported += 1
+        return imported
+
+    def export_tmx(self, file_path: str, source_lang: str) -> int:
+        """
+        Writes the cache as a TMX 1.4 file, one translation unit per source segment. Returns the unit count.
+        Entries don't record their source language (DeepL detects it), so the caller has to name it.
+        """
+        sources = {}
+        for lang, key, translation in self._iter_entries():
+            sources.setdefault(key, []).append((lang, translation))
+
+        with open(file_path, 'w', encoding='utf-8') as tmx:
+            tmx.write('<?xml version="1.0" encoding="UTF-8"?>\n<tmx version="1.4">\n')
+            tmx.write(f'  <header creationtool="RuvysTaggedTranslator" creationtoolversion="1.0" datatype="plaintext" '
+                      f'segtype="sentence" adminlang="en" srclang={quoteattr(source_lang.lower())} o-tmf="cache"/>\n  <body>\n')
+            for key, translations in sources.items():
+                tmx.write(f'    <tu>\n      <tuv xml:lang={quoteattr(source_lang.lower())}><seg>{escape(key)}</seg></tuv>\n')
+                for lang, translation in translations:
+                    tmx.write(f'      <tuv xml:lang={quoteattr(lang.lower())}><seg>{escape(translation)}</seg></tuv>\n')
+                tmx.write('    </tu>\n')
+            tmx.write('  </body>\n</tmx>\n')
+        return len(sources)
+
+
+class EventLoopMonitor:
+    """
+    Measures how long the Tk main loop is blocked, using a periodic after() heartbeat.
+    Each tick records how much later than scheduled it ran, that delay is time the GUI could not respond.
+    """
+
+    def __init__(self, master, interval_ms: int = LOOP_MONITOR_INTERVAL_MS, stall_ms: float = LOOP_MONITOR_STALL_MS):
+        self.master = master
+        self.interval_ms = interval_ms
+        self.stall_ms = stall_ms # delays above this count as a stall
+        self.stalls: typing.Deque[typing.Tuple[float, float]] = deque(maxlen=100) # (time.time(), delay ms)
+        self.max_delay_ms = 0.0
+        self.ticks = 0
+        self._expected = 0.0
+        self._job = None
+
+    def start(self):
+        self._expected = time.perf_counter() + self.interval_ms / 1000
+        self._job = self.master.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        if self._job is not None:
+            self.master.after_cancel(self._job)
+            self._job = None
+
+    def _tick(self):
+        now = time.perf_counter()
+        delay_ms = max(0.0, (now - self._expected) * 1000)
+        self.ticks += 1
+        self.max_delay_ms = max(self.max_delay_ms, delay_ms)
+        if delay_ms >= self.stall_ms:
+            self.stalls.append((time.time(), delay_ms))
+        self._expected = now + self.interval_ms / 1000
+        self._job = self.master.after(self.interval_ms, self._tick)
+
+    def summary(self) -> str:
+        recent = ", ".join(f"{delay:.0f}" for _, delay in list(self.stalls)[-5:]) or "none"
+        return (f"Event loop: {self.ticks} heartbeats every {self.interval_ms} ms, worst delay {self.max_delay_ms:.0f} ms, "
+                f"{len(self.stalls)} stalls >= {self.stall_ms:.0f} ms (last: {recent})")
+
+def profile_call(action: typing.Callable[[], typing.Any], top: int = PROFILE_TOP_FUNCTIONS) -> typing.Tuple[typing.Any, str]:
+    """
+    Runs action under cProfile and tracemalloc, returns (action result, text report)
+    with wall time, peak traced memory and the top functions by cumulative time.
+    """
+    profiler = cProfile.Profile()
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        result = profiler.runcall(action)
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        if started_tracing:
+            tracemalloc.stop()
+
+    stats_output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stats_output)
+    stats.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+    report = f"Wall time: {elapsed * 1000:.1f} ms\nPeak memory: {peak / 1024 / 1024:.2f} MB\n\n{stats_output.getvalue().strip()}"
+    return result, report
+
+class OrderedRowWriter:
+    """
+    CSV writer for parallel bulk jobs: rows are submitted with their input index in any order
+    and written out in input order as soon as every earlier row is there.
+    At most `capacity` rows wait in the reorder buffer, a producer submitting a row further ahead
+    blocks until the gap closes. Rows are collected in memory and written in flush_chars sized chunks.
+    """
+
+    def __init__(self, output: typing.TextIO, capacity: int = ORDERED_WRITER_CAPACITY, flush_chars: int = ORDERED_WRITER_FLUSH_CHARS):
+        self.output = output
+        self.capacity = capacity
+        self.flush_chars = flush_chars
+        self.next_index = 0
+        self._pending: typing.Dict[int, typing.List] = {}
+        self._buffer = io.StringIO()
+        self._csv = csv.writer(self._buffer)
+        self._condition = threading.Condition()
+
+    def submit(self, index: int, row: typing.List):
+        with self._condition:
+            # Backpressure, the row the writer is waiting for is always accepted so this can't deadlock
+            while index >= self.next_index + self.capacity:
+                self._condition.wait()
+            self._pending[index] = row
+            while self.next_index in self._pending:
+                self._csv.writerow(self._pending.pop(self.next_index))
+                self.next_index += 1
+            if self._buffer.tell() >= self.flush_chars:
+                self._flush()
+            self._condition.notify_all()
+
+    def close(self):
+        """Writes everything that is in order, rows still missing an earlier row are reported and dropped."""
+        with self._condition:
+            if self._pending:
+                print(f"Warning: {len(self._pending)} rows never became writable, row {self.next_index} is missing.")
+            self._flush()
+
+    def _flush(self):
+        self.output.write(self._buffer.getvalue())
+        self._buffer.seek(0)
+        self._buffer.truncate()
+
+class SessionStore:
+    """
+    On-disk, list-like replacement for the in-memory undo history.
+    Each state is a [top, bottom] pair of pane contents. Panes are zlib-compressed and appended to
+    panes.dat, a pane that did not change since the previous state is not written again.
+    history.idx holds one fixed-size (offset, length) record per pane per state, so reopening a session
+    only reads that index, states are decompressed on demand and the last few are kept in memory.
+    The history is capped at max_states, and panes.dat is compacted once most of it is no longer referenced
+    (dropped redo tails and old states). The directory is locked, a second instance gets an OSError.
+    """
+    _RECORD = struct.Struct("<QQQQ") # top offset, top length, bottom offset, bottom length
+
+    def __init__(self, directory: str = SESSION_DIR, cache_size: int = SESSION_CACHE_STATES, max_states: int = SESSION_MAX_STATES):
+        os.makedirs(directory, exist_ok=True)
+        self.data_path = os.path.join(directory, "panes.dat")
+        self.index_path = os.path.join(directory, "history.idx")
+        self.cache_size = cache_size
+        self.max_states = max_states
+        self._decoded: "OrderedDict[int, typing.List[str]]" = OrderedDict()
+        self._lock_file = self._lock_directory(directory) # held until the process exits
+
+        open(self.data_path, 'ab').close()
+        data_size = os.path.getsize(self.data_path)
+        with open(self.index_path, 'ab+') as index_file:
+            index_file.seek(0)
+            raw = index_file.read()
+        # Drop a torn record or one pointing past the data file, i.e. an append interrupted by a crash
+        self._records = []
+        for start in range(0, len(raw) - self._RECORD.size + 1, self._RECORD.size):
+            record = self._RECORD.unpack_from(raw, start)
+            if record[0] + record[1] > data_size or record[2] + record[3] > data_size:
+                break
+            self._records.append(record)
+        if len(raw) != len(self._records) * self._RECORD.size:
+            self._truncate_index()
+
+        # A state that can't be decompressed (damaged file) ends the history, the states before it are kept
+        while self._records:
+            try:
+                self[-1]
+                break
+            except (zlib.error, UnicodeDecodeError) as e:
+                print(f"Error reading session state {len(self._records) - 1}, dropping it: {e}")
+                self._records.pop()
+                self._decoded.clear()
+                self._truncate_index()
+        self._compact_if_wasteful()
+
+    @staticmethod
+    def _lock_directory(directory: str) -> typing.BinaryIO:
+        lock_file = open(os.path.join(directory, "session.lock"), 'a+b')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            raise OSError(f"Session '{directory}' is already in use by another instance")
+        return lock_file
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, index: int) -> typing.List[str]:
+        if index < 0:
+            index += len(self._records)
+        if not 0 <= index < len(self._records):
+            raise IndexError("session history index out of range")
+        if index in self._decoded:
+            self._decoded.move_to_end(index)
+            return list(self._decoded[index])
+
+        top_offset, top_length, bottom_offset, bottom_length = self._records[index]
+        with open(self.data_path, 'rb') as data_file:
+            state = [self._read_pane(data_file, top_offset, top_length), self._read_pane(data_file, bottom_offset, bottom_length)]
+        self._remember(index, state)
+        return list(state)
+
+    def __delitem__(self, index: slice):
+        """Only `del store[n:]` is supported, which is what dropping the redo tail needs."""
+        if not isinstance(index, slice) or index.stop is not None or index.step is not None:
+            raise TypeError("SessionStore only supports deleting a tail slice, e.g. del store[n:]")
+        start = index.start or 0
+        del self._records[start:]
+        for cached in [i for i in self._decoded if i >= start]:
+            del self._decoded[cached]
+        self._truncate_index()
+
+    def append(self, state: typing.List[str]):
+        previous = self._records[-1] if self._records else None
+        previous_state = self[-1] if previous else None
+
+        with open(self.data_path, 'ab') as data_file:
+            panes = []
+            for pane, text in enumerate(state[:2]):
+                if previous_state is not None and previous_state[pane] == text:
+                    panes.extend(previous[pane * 2:pane * 2 + 2]) # type: ignore
+                    continue
+                blob = zlib.compress(text.encode('utf-8'))
+                panes.extend((data_file.seek(0, os.SEEK_END), len(blob))) # tell() is not the end of an append-mode file before the first write
+                data_file.write(blob)
+        record = tuple(panes)
+        with open(self.index_path, 'ab') as index_file:
+            index_file.write(self._RECORD.pack(*record))
+        self._records.append(record)
+        self._remember(len(self._records) - 1, [state[0], state[1]])
+
+        if len(self._records) > self.max_states:
+            # Drop the oldest quarter at once, so the files are not rewritten on every append
+            del self._records[:len(self._records) - self.max_states * 3 // 4]
+            self._decoded.clear()
+            self._compact()
+        else:
+            self._compact_if_wasteful()
+
+    def clear(self):
+        """Starts a new session, the old pane data is discarded."""
+        self._records = []
+        self._decoded.clear()
+        open(self.data_path, 'wb').close()
+        self._truncate_index()
+
+    def _live_bytes(self) -> int:
+        panes = {(record[i], record[i + 1]) for record in self._records for i in (0, 2)}
+        return sum(length for _, length in panes)
+
+    def _compact_if_wasteful(self):
+        data_size = os.path.getsize(self.data_path)
+        if data_size >= SESSION_COMPACT_MIN_BYTES and self._live_bytes() * 2 < data_size:
+            self._compact()
+
+    def _compact(self):
+        """Rewrites panes.dat with only the panes still referenced, and the index to match."""
+        moved: typing.Dict[typing.Tuple[int, int], int] = {}
+        records = []
+        with open(self.data_path, 'rb') as data_file, open(self.data_path + ".tmp", 'wb') as new_data_file:
+            for record in self._records:
+                new_record = []
+                for offset, length in (record[0:2], record[2:4]):
+                    if (offset, length) not in moved:
+                        data_file.seek(offset)
+                        moved[(offset, length)] = new_data_file.tell()
+                        new_data_file.write(data_file.read(length))
+                    new_record.extend((moved[(offset, length)], length))
+                records.append(tuple(new_record))
+        with open(self.index_path + ".tmp", 'wb') as new_index_file:
+            new_index_file.write(b"".join(self._RECORD.pack(*record) for record in records))
+        # Empty the index first, if we stop in between the session reopens empty instead of pointing into the wrong file
+        self._records = []
+        self._truncate_index()
+        os.replace(self.data_path + ".tmp", self.data_path)
+        os.replace(self.index_path + ".tmp", self.index_path)
+        self._records = records
+
+    def _read_pane(self, data_file, offset: int, length: int) -> str:
+        data_file.seek(offset)
+        return zlib.decompress(data_file.read(length)).decode('utf-8')
+
+    def _remember(self, index: int, state: typing.List[str]):
+        self._decoded[index] = state
+        self._decoded.move_to_end(index)
+        while len(self._decoded) > self.cache_size:
+            self._decoded.popitem(last=False)
+
+    def _truncate_index(self):
+        with open(self.index_path, 'r+b') as index_file:
+            index_file.truncate(len(self._records) * self._RECORD.size)
+
+# WAL needs shared memory between all connections, which these filesystems can't provide across hosts
+_NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "afs", "ceph", "glusterfs", "lustre", "fuse.sshfs", "davfs", "fuse.s3fs"}
+
+def _is_network_filesystem(path: str) -> bool:
+    """True if path lies on a network share (UNC path on Windows, NFS/SMB/... mount on Linux)."""
+    if path.startswith("\\\\"):
+        return True
+    path = os.path.abspath(path)
+    try:
+        with open("/proc/mounts", encoding="utf-8") as mounts:
+            entries = [line.split() for line in mounts]
+    except OSError:
+        return False # not Linux, nothing to check against
+    best_mount, best_type = "", ""
+    for entry in entries:
+        if len(entry) < 3:
+            continue
+        mount_point = entry[1].replace("\\040", " ")
+        if (path == mount_point or path.startswith(mount_point.rstrip("/") + "/")) and len(mount_point) > len(best_mount):
+            best_mount, best_type = mount_point, entry[2]
+    return best_type in _NETWORK_FILESYSTEMS
+
+class SqliteTranslationCache(TranslationCache):
+    """
+    Segment cache shared by several processes on one host through one SQLite file in WAL mode.
+    WAL does not work over network filesystems, a path on an NFS/SMB share is refused.
+    It is the local stand-in for a remote cache service: the same get/put/claim/wait/flush calls could
+    talk to a network store instead.
+    Lookups go through the in-process dict first. New entries are queued and written in one transaction
+    per flush (or every write_batch entries). Before translating, a worker claims its segments in a
+    claims table, other workers wait for those instead of sending them to DeepL again, so all workers
+    together pay for each unique segment once. A claim expires after claim_timeout seconds,
+    in case the worker holding it died.
+    """
+
+    def __init__(self, path: str = SHARED_CACHE_FILE, write_batch: int = SHARED_CACHE_WRITE_BATCH, claim_timeout: float = SHARED_CACHE_CLAIM_TIMEOUT):
+        if _is_network_filesystem(path):
+            raise ValueError(f"Shared cache '{path}' is on a network filesystem, SQLite WAL only works for processes on one host.")
+        super().__init__()
+        self.path = path
+        self.write_batch = write_batch
+        self.claim_timeout = claim_timeout
+        self.process_id = uuid.uuid4().hex # claims are owned per process and thread, see _owner
+        self._pending: typing.List[typing.Tuple[str, str, str]] = []
+        self._local = threading.local() # sqlite3 connections can't be shared between threads
+
+        with self._connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS segments (lang TEXT NOT NULL, source TEXT NOT NULL, translation TEXT NOT NULL, "
+                               "PRIMARY KEY (lang, source)) WITHOUT ROWID")
+            connection.execute("CREATE TABLE IF NOT EXISTS claims (lang TEXT NOT NULL, source TEXT NOT NULL, owner TEXT NOT NULL, "
+                               "expires REAL NOT NULL, PRIMARY KEY (lang, source)) WITHOUT ROWID")
+        atexit.register(self.flush)
+
+    def _owner(self) -> str:
+        return f"{self.process_id}-{threading.get_ident()}"
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL") # readers never block the writer and vice versa
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def __len__(self) -> int:
+        self.flush()
+        return self._connection().execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+
+    def _lookup(self, key: str, lang: str) -> typing.Optional[str]:
+        translation = super()._lookup(key, lang)
+        if translation is None:
+            row = self._connection().execute("SELECT translation FROM segments WHERE lang = ? AND source = ?", (lang, key)).fetchone()
+            if row is not None:
+                translation = row[0]
+                super()._store(key, lang, translation)
+        return translation
+
+    def _store(self, key: str, lang: str, translation: str):
+        super()._store(key, lang, translation)
+        with self._lock:
+            self._pending.append((lang, key, translation))
+            full = len(self._pending) >= self.write_batch
+        if full:
+            self.flush()
+
+    def _iter_entries(self) -> typing.Iterator[typing.Tuple[str, str, str]]:
+        self.flush()
+        yield from self._connection().execute("SELECT lang, source, translation FROM segments")
+
+    def flush(self):
+        """Writes queued entries in a single transaction."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if pending:
+            with self._connection() as connection:
+                connection.executemany("INSERT OR REPLACE INTO segments (lang, source, translation) VALUES (?, ?, ?)", pending)
+
+    def claim(self, texts: typing.List[str], lang: str) -> typing.Set[int]:
+        lang = lang.upper()
+        owner = self._owner()
+        keys = [normalize_segment(text) for text in texts]
+        now = time.time()
+        claimed = set()
+        with self._connection() as connection:
+            connection.execute("DELETE FROM claims WHERE expires < ?", (now,))
+            connection.executemany("INSERT OR IGNORE INTO claims (lang, source, owner, expires) VALUES (?, ?, ?, ?)",
+                                   [(lang, key, owner, now + self.claim_timeout) for key in keys])
+            for start in range(0, len(keys), SHARED_CACHE_WRITE_BATCH):
+                chunk = keys[start:start + SHARED_CACHE_WRITE_BATCH]
+                claimed.update(row[0] for row in connection.execute(
+                    f"SELECT source FROM claims WHERE lang = ? AND owner = ? AND source IN ({','.join('?' * len(chunk))})", [lang, owner] + chunk))
+        # Someone may have finished a segment between planning the batch and claiming it, give those claims back
+        finished = {key for key in claimed if self._lookup(key, lang) is not None}
+        if finished:
+            with self._connection() as connection:
+                connection.executemany("DELETE FROM claims WHERE lang = ? AND source = ? AND owner = ?",
+                                       [(lang, key, owner) for key in finished])
+        return {i for i, key in enumerate(keys) if key in claimed and key not in finished}
+
+    def wait(self, texts: typing.List[str], lang: str) -> typing.List[typing.Optional[str]]:
+        lang = lang.upper()
+        deadline = time.time() + self.claim_timeout
+        results = [self.get(text, lang) for text in texts]
+        while any(result is None for result in results) and time.time() < deadline:
+            missing = [i for i, result in enumerate(results) if result is None]
+            still_claimed = self._connection().execute(
+                f"SELECT COUNT(*) FROM claims WHERE lang = ? AND expires >= ? AND source IN ({','.join('?' * len(missing))})",
+                [lang, time.time()] + [normalize_segment(texts[i]) for i in missing]).fetchone()[0]
+            if not still_claimed:
+                # Released without a result (the other worker failed), re-check once more below and stop waiting
+                deadline = 0
+            else:
+                time.sleep(SHARED_CACHE_POLL_INTERVAL)
+            for i in missing:
+                results[i] = self.get(texts[i], lang)
+        return results
+
+    def release(self, texts: typing.List[str], lang: str):
+        if not texts:
+            return
+        lang = lang.upper()
+        with self._connection() as connection:
+            connection.executemany("DELETE FROM claims WHERE lang = ? AND source = ? AND owner = ?",
+                                   [(lang, normalize_segment(text), self._owner()) for text in texts])
+
+def open_translation_memory() -> TranslationCache:
+    """
+    The default segment cache: shared SQLite cache if SHARED_CACHE_ENV is set, in-memory otherwise,
+    pre-warmed from TRANSLATION_MEMORY_FILE so a fresh machine does not pay DeepL again.
+    """
+    cache = SqliteTranslationCache(os.environ[SHARED_CACHE_ENV]) if os.environ.get(SHARED_CACHE_ENV) else TranslationCache()
+    if os.path.exists(TRANSLATION_MEMORY_FILE):
+        try:
+            cache.import_tmx(TRANSLATION_MEMORY_FILE)
+        except Exception as e:
+            print(f"Error loading translation memory '{TRANSLATION_MEMORY_FILE}': {e}")
+    return cache
+
+def save_translation_memory(cache: TranslationCache, file_path: str, source_lang: str) -> int:
+    """
+    Exports the cache to file_path as TMX, replacing the old file only once the new one is complete.
+    The temporary file is unique, so concurrent exports never write into the same file. Returns the unit count.
+    """
+    descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)), suffix=".tmx.tmp")
+    os.close(descriptor)
+    try:
+        units = cache.export_tmx(temp_path, source_lang)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return units
+
+def run_translation_memory_cli(args: typing.List[str]) -> int:
+    """
+    Headless translation memory maintenance, e.g. to ship a warm cache to another machine:
+        python translator.py --import-csv old.csv --source-lang DE --export-tmx translation_memory.tmx
+    --import-tmx / --import-csv FILE load into the default cache in the order given, --export-tmx FILE writes it out.
+    The cache does not know what language its sources are in, --source-lang is required for an export.
+    """
+    source_lang = args[args.index("--source-lang") + 1] if "--source-lang" in args[:-1] else ""
+    if "--export-tmx" in args and not source_lang:
+        print("Error: --export-tmx needs --source-lang LANG, the language of the cached source segments.")
+        return 2
+    cache = open_translation_memory()
+    actions = {"--import-tmx": cache.import_tmx, "--import-csv": cache.import_csv, "--export-tmx": lambda path: save_translation_memory(cache, path, source_lang)}
+    for flag, path in zip(args, args[1:]):
+        if flag not in actions:
+            continue
+        try:
+            count = actions[flag](path)
+        except Exception as e:
+            print(f"Error: {flag} '{path}' failed: {e}")
+            return 1
+        print(f"{flag} {path}: {count} {'units' if flag == '--export-tmx' else 'entries'}")
+    cache.flush()
+    return 0
+
+def csv_job_layout(rows: typing.List[typing.List[str]], target_lang_row: int, source_column: int, ignored_columns: typing.List[int]
+                   ) -> typing.Tuple[typing.List[str], typing.List[str], typing.List[str]]:
+    """
+    Reads a csv_translate input: returns (source texts, target languages, output header).
+    Every column not in ignored_columns is a target language, shared by csv_translate and TranslationJob.from_csv
+    so both translate (and estimate) the same work.
+    """
+    source_texts = []
+    for i, row in enumerate(rows):
+        if i == target_lang_row:
+            continue
+        if len(row) > source_column:
+            source_texts.append(row[source_column])
+        else:
+            print(f"Row {i} does not have enough columns. Skipping.")
+
+    target_langs = []
+    for index, lang in enumerate(rows[target_lang_row]):
+        if index not in ignored_columns:
+            target_langs.append(lang.strip())
+
+    header = [rows[target_lang_row][source_column]] + [rows[target_lang_row][i] for i in ignored_columns]
+    return source_texts, target_langs, header
+
+class TranslationJob:
+    """
+    A set of source texts to be translated into several languages, e.g. one csv_translate run.
+    Results are kept per (row, language), so a paused job resumes where it stopped.
+    Columns that are not DeepL target languages are never translated, their cells stay empty.
+    """
+
+    def __init__(self, name: str, source_texts: typing.List[str], target_langs: typing.List[str], priority: int = 0):
+        self.name = name
+        self.source_texts = source_texts
+        self.target_langs = target_langs
+        self.translatable_langs = [lang for lang in target_langs if lang.upper() in DeepLTranslator.available_langs]
+        self.priority = priority # higher runs first
+        self.header = ["source"] + target_langs
+        self.results: typing.Dict[typing.Tuple[int, str], str] = {}
+        self.estimated_chars = 0
+        self.status = "pending" # pending / paused / done / failed
+
+    @classmethod
+    def from_csv(cls, input_file: str, target_lang_row: int, source_column: int, ignored_columns: typing.List[int], priority: int = 0,
+                 resume_file: str = "") -> "TranslationJob":
+        """
+        Builds a job from a csv_translate input (language codes in target_lang_row).
+        If resume_file is an earlier write_csv output of the same job, its filled cells count as done.
+        """
+        with open(input_file, 'r', encoding='utf-8') as csvfile:
+            rows = list(csv.reader(csvfile))
+
+        source_texts, target_langs, header = csv_job_layout(rows, target_lang_row, source_column, ignored_columns)
+        job = cls(input_file, source_texts, target_langs, priority)
+        job.header = header
+
+        if resume_file and os.path.exists(resume_file):
+            with open(resume_file, 'r', encoding='utf-8', newline='') as csvfile:
+                done_rows = list(csv.reader(csvfile))[1:]
+            for row, cells in enumerate(done_rows[:len(source_texts)]):
+                if not cells or cells[0] != source_texts[row]:
+                    continue # not the same input any more
+                for lang, cell in zip(target_langs, cells[1:]):
+                    if cell:
+                        job.results[(row, lang)] = cell
+        return job
+
+    def pending_units(self) -> typing.Iterator[typing.Tuple[int, str, str]]:
+        """Yields (row, source text, language) for every translation not done yet."""
+        for row, text in enumerate(self.source_texts):
+            for lang in self.translatable_langs:
+                if (row, lang) not in self.results:
+                    yield row, text, lang
+
+    def is_done(self) -> bool:
+        return next(self.pending_units(), None) is None
+
+    def write_csv(self, output_file: str):
+        """Writes the header and one row per source text, translations not done yet are left empty."""
+        with open(output_file, 'w', encoding='utf-8', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(self.header)
+            for row, text in enumerate(self.source_texts):
+                writer.writerow([text] + [self.results.get((row, lang), "") for lang in self.target_langs])
+
+class QuotaScheduler:
+    """
+    Runs translation jobs in priority order within a DeepL character budget.
+    Every job is tokenized up front and its billable characters estimated after cache hits and skip rules.
+    A translation that does not fit into what is left of the budget or of the account quota is deferred
+    and its job paused, smaller ones after it (also of lower priority jobs) still use up the rest.
+    Calling run() again (e.g. next month, or with a new budget) resumes the deferred work.
+    """
+
+    def __init__(self, translator: "DeepLTranslator", character_budget: typing.Optional[int] = None, use_account_quota: bool = True):
+        self.translator = translator
+        self.character_budget = character_budget # None = only limited by the account quota
+        self.use_account_quota = use_account_quota
+        self.jobs: typing.List[TranslationJob] = []
+        self.spent = 0
+
+    def add_job(self, job: TranslationJob) -> int:
+        """Queues a job and returns its estimated billable characters."""
+        job.estimated_chars = self.estimate(job)
+        self.jobs.append(job)
+        return job.estimated_chars
+
+    def estimate(self, job: TranslationJob) -> int:
+        """Billable characters of the job's remaining work, segments repeated across rows are counted once."""
+        segments_by_lang: typing.Dict[str, typing.List[str]] = {}
+        for _, text, lang in job.pending_units():
+            segments_by_lang.setdefault(lang, []).extend(tokenize_html_and_plaintext(text).plaintext_segments())
+        return sum(self.translator.billable_characters(segments, lang) for lang, segments in segments_by_lang.items())
+
+    def estimated_total(self) -> int:
+        return sum(job.estimated_chars for job in self.jobs if job.status != "done")
+
+    def available_characters(self) -> typing.Optional[int]:
+        """Characters that may still be spent, the smaller of the remaining budget and remaining account quota."""
+        available = None
+        if self.character_budget is not None:
+            available = self.character_budget - self.spent
+        if self.use_account_quota:
+            usage = self.translator.get_usage()
+            if usage is not None:
+                used, limit = usage
+                available = limit - used if available is None else min(available, limit - used)
+        return available
+
+    def preflight(self) -> typing.Optional[str]:
+        """Compares the estimate of all queued work with what is available, returns a warning if it does not fit."""
+        estimated = self.estimated_total()
+        available = self.available_characters()
+        if available is not None and estimated > available:
+            return f"Queued work needs about {estimated} characters, only {available} left in budget."
+        return None
+
+    def run(self, allow_partial: bool = False) -> bool:
+        """
+        Translates queued jobs, deferring translations that no longer fit into the budget.
+        Unless allow_partial is set, nothing is translated when the estimate already exceeds the budget.
+        Returns True if every job finished, False if some work was deferred, failed or the run did not start.
+        """
+        if not allow_partial:
+            warning = self.preflight()
+            if warning is not None:
+                print(f"Not started: {warning}")
+                return False
+        available = self.available_characters()
+        # Highest priority first, cheaper jobs first within a priority so more jobs complete per quota unit
+        queued = sorted((job for job in self.jobs if job.status != "done"), key=lambda job: (-job.priority, job.estimated_chars))
+        for job in queued:
+            deferred = 0
+            for row, text, lang in list(job.pending_units()):
+                tokens = tokenize_html_and_plaintext(text)
+                segments = list(tokens.plaintext_segments())
+                cost = self.translator.billable_characters(segments, lang)
+                if available is not None and cost > available:
+                    deferred += 1 # leave it for the next run, cheaper units may still fit
+                    continue
+                try:
+                    # Fully cached / empty units cost nothing, translate_batch fills them without calling DeepL
+                    translated = self.translator.translate_batch(segments, lang) if segments else []
+                except Exception as e:
+                    job.status = "failed"
+                    job.estimated_chars = self.estimate(job)
+                    print(f"Error translating job '{job.name}' row {row} to {lang}: {e}")
+                    return False
+                job.results[(row, lang)] = reassemble_tokens_with_translations(tokens, translated)
+                self.spent += cost
+                if available is not None:
+                    available -= cost
+            job.estimated_chars = self.estimate(job) if deferred else 0
+            job.status = "paused" if deferred else "done"
+            if deferred:
+                print(f"Paused '{job.name}': {deferred} translations ({job.estimated_chars} characters) did not fit, {available} left in budget.")
+        return all(job.status == "done" for job in self.jobs)
+
+def run_csv_jobs_cli(args: typing.List[str]) -> int:
+    """
+    Headless CSV translation within a character budget, highest priority first:
+        python translator.py --csv-job a.csv a_out.csv 5 --csv-job b.csv b_out.csv 1 --budget 100000 --allow-partial
+    Optional --header-row, --source-column and --ignored-columns 1,2 describe the inputs like the CSV popup (default 0, 0, none).
+    Each output is written with what got translated, running the same command again resumes from it.
+    """
+    def option(name: str, default: str) -> str:
+        return args[args.index(name) + 1] if name in args[:-1] else default
+
+    try:
+        header_row = int(option("--header-row", "0"))
+        source_column = int(option("--source-column", "0"))
+        ignored = [int(column) for column in option("--ignored-columns", "").split(",") if column.strip()]
+        budget = int(option("--budget", "-1"))
+        jobs = []
+        for i, arg in enumerate(args):
+            if arg == "--csv-job":
+                input_file, output_file, priority = args[i + 1:i + 4]
+                jobs.append((TranslationJob.from_csv(input_file, header_row, source_column, ignored, int(priority), resume_file=output_file), output_file))
+    except (ValueError, OSError, IndexError) as e:
+        print(f"Error: {e}\nUsage: python translator.py --csv-job INPUT OUTPUT PRIORITY [--csv-job ...] [--budget CHARS] [--allow-partial]")
+        return 2
+
+    scheduler = QuotaScheduler(DeepLTranslator(), character_budget=budget if budget >= 0 else None)
+    for job, _ in jobs:
+        print(f"'{job.name}': about {scheduler.add_job(job)} billable characters")
+    finished = scheduler.run(allow_partial="--allow-partial" in args)
+    for job, output_file in jobs:
+        if job.results:
+            job.write_csv(output_file)
+        print(f"'{job.name}': {job.status}, written to {output_file}" if job.results else f"'{job.name}': {job.status}")
+    return 0 if finished else 1
 
 class DeepLTranslator:
     available_langs_desc = [
@@ -787,7 +2214,7 @@ class DeepLTranslator:
     ]
     available_langs = {lang[0] for lang in available_langs_desc}
 
-    def __init__(self, api_key: str = ""):
+    def __init__(self, api_key: str = "", cache: typing.Optional[TranslationCache] = None):
         if api_key:
             self.api_key = api_key
         else:
@@ -799,10 +2226,47 @@ class DeepLTranslator:
                 raise ValueError("API key file 'api.key' not found. Please provide a valid DeepL API key.")
 
         self.translator = deepl.Translator(self.api_key)
-        self.target_lang = "EN-US" # Default target language
-        
+        self.target_lang = "EN-US" # Default target language, only used when a request does not pass one
+
+        # Pool of clients so parallel requests never share one HTTP session, grown lazily up to DEEPL_CLIENT_POOL_SIZE
+        self._client_pool = queue.LifoQueue()
+        self._client_pool.put(self.translator)
+        self._client_count = 1
+        self._client_lock = threading.Lock()
+
+        if cache is None:
+            cache = open_translation_memory()
+        self.cache = cache
     
 
+    @contextmanager
+    def _client(self) -> typing.Iterator[deepl.Translator]:
+        """Borrows a deepl.Translator from the pool for the duration of one request."""
+        try:
+            client = self._client_pool.get_nowait()
+        except queue.Empty:
+            with self._client_lock:
+                create = self._client_count < DEEPL_CLIENT_POOL_SIZE
+                if create:
+                    self._client_count += 1
+            client = deepl.Translator(self.api_key) if create else self._client_pool.get()
+        try:
+            yield client
+        finally:
+            self._client_pool.put(client)
+
+    def resolve_language(self, lang: str = "") -> str:
+        """
+        Returns the DeepL code to use for one request: `lang` if given, otherwise the current target language.
+        Never changes the translator state, raises ValueError for unsupported languages.
+        """
+        if not lang:
+            return self.target_lang
+        lang = lang.upper()
+        if lang not in self.available_langs:
+            raise ValueError(f"Unsupported target language: {lang}. Please select from the available languages.")
+        return lang
+
     def current_language(self) -> str:
         """Returns the current target language for translation."""
         return self.target_lang
@@ -825,63 +2289,136 @@ class DeepLTranslator:
             print(f"Unsupported language: {lang}. Available languages: {self.available_langs}")
             return False
 
+    def _plan_batch(self, texts: typing.List[str], lang: str):
+        """
+        Decides which texts of a batch actually go to DeepL.
+        Returns (result list prefilled with empty and cached texts, texts to send, filtered index -> original indices).
+        """
+        # Filter out empty strings before sending to DeepL to avoid unnecessary API calls
+        # and potential errors if DeepL doesn't handle empty strings well in batches.
+        # Keep track of original indices to reinsert empty strings later.
+        # Segments already in the cache are filled in directly, repeated segments are sent only once.
+        final_translated_texts = list(texts)
+        non_empty_texts_map = []
+        original_to_filtered_indices = {} # filtered index -> all original indices with that text
+        filtered_by_text = {}
+        for i, text in enumerate(texts):
+            if not text.strip(): # Only process non-empty, non-whitespace strings
+                continue
+            cached = self.cache.get(text, lang)
+            if cached is not None:
+                final_translated_texts[i] = cached
+                continue
+            key = normalize_segment(text)
+            if key not in filtered_by_text:
+                non_empty_texts_map.append(text)
+                filtered_by_text[key] = len(non_empty_texts_map) - 1
+            original_to_filtered_indices.setdefault(filtered_by_text[key], []).append(i) # Map filtered index to original index
+        return final_translated_texts, non_empty_texts_map, original_to_filtered_indices
+
+    def billable_characters(self, texts: typing.List[str], lang: str = "") -> int:
+        """Characters translate_batch(texts, lang) would send to DeepL right now, after cache hits and skip rules."""
+        _, to_send, _ = self._plan_batch(texts, self.resolve_language(lang))
+        return sum(len(text) for text in to_send)
+
+    def get_usage(self) -> typing.Optional[typing.Tuple[int, int]]:
+        """Returns (characters used, character limit) of the DeepL account, or None if the account has no character limit."""
+        try:
+            with self._client() as client:
+                usage = client.get_usage()
+        except deepl.exceptions.DeepLException as e:
+            raise Exception(f"DeepL API usage error: {e}")
+        if usage.character is None or not usage.character.limit:
+            return None
+        return usage.character.count, usage.character.limit
+
     def translate(self, text: str, target_lang: str = "") -> str:
         """
         Translates the given text to the specified target language using DeepL.
+        Safe to call from several threads, the language only applies to this request.
         """
         if DEEPL_PROHIBIT_TRANSLATION:
             raise Exception("Translation is currently prohibited, safeguard in case I want to limit API usage while testing.")
         
-        if target_lang and not self.set_target_language(target_lang):
-            raise ValueError(f"Unsupported target language: {target_lang}. Please select from the available languages.")
+        target_lang = self.resolve_language(target_lang)
+
+        cached = self.cache.get(text, target_lang)
+        if cached is not None:
+            return cached
 
         try:
-            result = self.translator.translate_text(text, target_lang=self.target_lang)
+            with self._client() as client:
+                result = client.translate_text(text, target_lang=target_lang)
+            self.cache.put(text, target_lang, result.text) # type: ignore
+            self.cache.flush()
             return result.text # type: ignore
         except deepl.exceptions.DeepLException as e:
             raise Exception(f"DeepL API error: {e}")
         except Exception as e:
             raise Exception(f"An unexpected error occurred during translation: {e}")
 
+    def _translate_uncached(self, texts: typing.List[str], lang: str) -> typing.List[str]:
+        """Sends texts to DeepL in one request and stores the results in the cache."""
+        # The DeepL Python client library's translate_text method can accept a list of strings
+        # and will handle the batching internally.
+        with self._client() as client:
+            results = client.translate_text(texts, target_lang=lang)
+
+        # The results object will be a list of TextResult objects.
+        # We need to extract the 'text' attribute from each.
+        translated_texts = [res.text for res in results] # type: ignore
+        for text, translated in zip(texts, translated_texts):
+            self.cache.put(text, lang, translated)
+        return translated_texts
+
     def translate_batch(self, texts: typing.List[str], lang: str = "") -> typing.List[str]:
         """
         Translates a list of texts to the specified target language using DeepL.
         This function is designed to be called asynchronously (e.g., in a separate thread).
+        It is re-entrant: `lang` only applies to this request and does not change current_language().
         It leverages DeepL's capability to translate lists of strings directly.
         """
         if DEEPL_PROHIBIT_TRANSLATION:
             raise Exception("Translation is currently prohibited, safeguard in case I want to limit API usage while testing.")
         
-        if lang and not self.set_target_language(lang):
-            raise ValueError(f"Unsupported target language: {lang}. Please select from the available languages.")
+        lang = self.resolve_language(lang)
+        final_translated_texts, non_empty_texts_map, original_to_filtered_indices = self._plan_batch(texts, lang)
 
-        # Filter out empty strings before sending to DeepL to avoid unnecessary API calls
-        # and potential errors if DeepL doesn't handle empty strings well in batches.
-        # Keep track of original indices to reinsert empty strings later.
-        non_empty_texts_map = []
-        original_to_filtered_indices = {}
-        for i, text in enumerate(texts):
-            if text.strip(): # Only process non-empty, non-whitespace strings
-                non_empty_texts_map.append(text)
-                original_to_filtered_indices[len(non_empty_texts_map) - 1] = i # Map filtered index to original index
-        
         if not non_empty_texts_map:
-            return [""] * len(texts) # If all are empty, return empty list of same length
+            return final_translated_texts # Everything was empty or cached
 
         try:
-            # The DeepL Python client library's translate_text method can accept a list of strings
-            # and will handle the batching internally.
-            results = self.translator.translate_text(non_empty_texts_map, target_lang=self.target_lang)
-            
-            # The results object will be a list of TextResult objects.
-            # We need to extract the 'text' attribute from each.
-            translated_filtered_texts = [res.text for res in results] # type: ignore
-
-            # Reconstruct the full list, reinserting empty strings at their original positions
-            final_translated_texts = texts
-            for filtered_idx, original_idx in original_to_filtered_indices.items():
-                if filtered_idx < len(translated_filtered_texts):
-                    final_translated_texts[original_idx] = translated_filtered_texts[filtered_idx]
+            # With a shared cache another worker may already be translating some of these segments.
+            # Only the claimed ones are sent, the rest are picked up from the cache once that worker is done.
+            owned = self.cache.claim(non_empty_texts_map, lang)
+            translated_filtered_texts: typing.List[typing.Optional[str]] = [None] * len(non_empty_texts_map)
+            try:
+                send = [i for i in range(len(non_empty_texts_map)) if i in owned]
+                if send:
+                    for i, translated in zip(send, self._translate_uncached([non_empty_texts_map[i] for i in send], lang)):
+                        translated_filtered_texts[i] = translated
+            finally:
+                self.cache.flush()
+                self.cache.release([non_empty_texts_map[i] for i in owned], lang)
+
+            waiting = [i for i in range(len(non_empty_texts_map)) if i not in owned]
+            if waiting:
+                for i, translated in zip(waiting, self.cache.wait([non_empty_texts_map[i] for i in waiting], lang)):
+                    translated_filtered_texts[i] = translated
+                missing = [i for i in waiting if translated_filtered_texts[i] is None]
+                if missing: # the other worker failed or gave up, pay for these ourselves
+                    for i, translated in zip(missing, self._translate_uncached([non_empty_texts_map[i] for i in missing], lang)):
+                        translated_filtered_texts[i] = translated
+                    self.cache.flush()
+
+            # Reconstruct the full list, keeping empty and cached strings at their original positions
+            for filtered_idx, original_indices in original_to_filtered_indices.items():
+                translated = translated_filtered_texts[filtered_idx]
+                if translated is not None:
+                    final_translated_texts[original_indices[0]] = translated
+                    for original_idx in original_indices[1:]:
+                        # Repeats may differ in surrounding whitespace, the cache re-applies it
+                        final_translated_texts[original_idx] = self.cache.get(texts[original_idx], lang) or translated
             
             return final_translated_texts
 
@@ -891,6 +2428,19 @@ class DeepLTranslator:
             raise Exception(f"An unexpected error occurred during batch translation: {e}")
 
 if __name__ == "__main__":
+    # Headless translation of a (possibly huge) HTML file: --translate-file IN OUT LANG
+    if "--translate-file" in sys.argv:
+        args = sys.argv[sys.argv.index("--translate-file") + 1:]
+        if len(args) < 3:
+            print("Usage: python translator.py --translate-file INPUT OUTPUT TARGET_LANG")
+            sys.exit(2)
+        sys.exit(0 if translate_file(DeepLTranslator(), args[0], args[1], args[2]) else 1)
+
+    if "--csv-job" in sys.argv:
+        sys.exit(run_csv_jobs_cli(sys.argv[1:]))
+    if any(flag in sys.argv for flag in ("--import-tmx", "--import-csv", "--export-tmx")):
+        sys.exit(run_translation_memory_cli(sys.argv[1:]))
+
     root = tk.Tk()
     root.title("<> Tag Comparator & Translator")
 